@@ -1,31 +1,63 @@
 from flask import Flask
 import os
-from app.auth.auth import init_db
+import secrets
+import tempfile
+from datetime import timedelta
+from app.auth.auth import init_db, check_access
 from app.api.routes import api
 from app.routes import main
 
+def _load_or_create_secret_key(path):
+    """Read the persisted secret key, generating it on first run"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        pass
+    
+    # The key is written to a private temp file and then linked into place, so
+    # path only ever appears complete; if another worker links first, use theirs
+    key = secrets.token_bytes(32)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(key)
+        os.link(tmp_path, path)
+    except FileExistsError:
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.unlink(tmp_path)
+    return key
+
 def create_app(test_config=None):
     # Create and configure the app
     app = Flask(__name__, instance_relative_config=True)
     
+    # Ensure the instance folder exists
+    try:
+        os.makedirs(app.instance_path, exist_ok=True)
+    except OSError:
+        pass
+    
     # Load configuration
     if test_config is None:
+        # A stable key keeps session cookies valid across restarts and workers
         app.config.from_mapping(
-            SECRET_KEY='your-secret-key-here',  # Change this in production
+            SECRET_KEY=os.environ.get('SECRET_KEY') or _load_or_create_secret_key(
+                os.path.join(app.instance_path, '.secret_key')),
             DATABASE=os.path.join(app.instance_path, 'bookmarks.db'),
+            PERMANENT_SESSION_LIFETIME=timedelta(hours=8),
         )
     else:
         app.config.from_mapping(test_config)
     
-    # Ensure the instance folder exists
-    try:
-        os.makedirs(app.instance_path, exist_ok=True)
-    except OSError:
-        pass
-    
     # Initialize database
     init_db(app)
     
+    # Login and admin checks for every endpoint, see PUBLIC_ENDPOINTS/ADMIN_ENDPOINTS
+    app.before_request(check_access)
+    
     # Register blueprints
     app.register_blueprint(api, url_prefix='/api')
     app.register_blueprint(main)
@@ -1,33 +1,59 @@
-from flask import Blueprint, request, jsonify, session, redirect, url_for
-from app.auth.auth import login_required, admin_required, get_db, verify_password
+from flask import Blueprint, Response, current_app, g, request, session, redirect, url_for
+from app.auth.auth import get_db, verify_password, needs_rehash, rehash_password, create_admin_user, SQL_GET_USER, DUMMY_PASSWORD_HASH
+from app.responses import json_response
 from bookmark_tracker import BookmarkTracker
-import secrets
+import gzip
 import hashlib
+import orjson
+import threading
 
 api = Blueprint('api', __name__)
-bookmark_tracker = BookmarkTracker()
+
+CREDENTIAL_FIELDS = frozenset({'username', 'password'})
+
+_tracker_lock = threading.Lock()
+
+def get_tracker():
+    """Get the app's bookmark tracker, creating it on first use"""
+    tracker = current_app.extensions.get('bookmark_tracker')
+    if tracker is None:
+        with _tracker_lock:
+            tracker = current_app.extensions.get('bookmark_tracker')
+            if tracker is None:
+                tracker = current_app.extensions['bookmark_tracker'] = BookmarkTracker()
+    return tracker
 
 @api.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
-    if not data or 'username' not in data or 'password' not in data:
-        return jsonify({'error': 'Missing username or password'}), 400
+    if not data or not CREDENTIAL_FIELDS.issubset(data):
+        return json_response({'error': 'Missing username or password'}, 400)
     
-    db = get_db()
-    cursor = db.cursor()
-    cursor.execute('SELECT * FROM users WHERE username = ?', (data['username'],))
-    user = cursor.fetchone()
-    db.close()
+    with get_db(readonly=True) as db:
+        # Plain tuples: the columns are unpacked by position below
+        cursor = db.cursor()
+        cursor.row_factory = None
+        cursor.execute(SQL_GET_USER, (data['username'],))
+        user = cursor.fetchone()
     
-    if not user or not verify_password(data['password'], user['password_hash'], user['salt']):
-        return jsonify({'error': 'Invalid username or password'}), 401
+    if not user:
+        verify_password(data['password'], DUMMY_PASSWORD_HASH)
+        return json_response({'error': 'Invalid username or password'}, 401)
     
-    session['logged_in'] = True
-    session['username'] = user['username']
-    session['is_admin'] = bool(user['is_admin'])
-    session['user_id'] = user['id']
+    user_id, password_hash, is_admin = user
+    if not verify_password(data['password'], password_hash):
+        return json_response({'error': 'Invalid username or password'}, 401)
     
-    return jsonify({'message': 'Login successful'})
+    # Upgrade legacy SHA-256 (or outdated scrypt) hashes while the password is at hand
+    if needs_rehash(password_hash):
+        rehash_password(user_id, data['password'])
+    
+    # Keep the signed cookie small: user_id alone marks the session as logged in
+    session.permanent = True
+    session['user_id'] = user_id
+    session['is_admin'] = bool(is_admin)
+    
+    return json_response({'message': 'Login successful'})
 
 @api.route('/logout', methods=['POST'])
 def logout():
@@ -35,133 +61,143 @@ def logout():
     return redirect(url_for('main.login_page'))
 
 @api.route('/bookmarks', methods=['GET'])
-@login_required
 def get_bookmarks():
-    bookmarks = bookmark_tracker.get_bookmarks()
-    return jsonify(bookmarks)
+    limit = request.args.get('limit', type=int)
+    after_id = request.args.get('after_id', type=int)
+    # Checked up front: once streaming starts the status can't change
+    if limit is not None and limit < 0:
+        return json_response({'error': 'limit must not be negative'}, 400)
+    tracker = get_tracker()
+    if after_id is not None and not tracker.has_bookmark(after_id):
+        return json_response({'error': 'Unknown after_id'}, 400)
+    bookmarks = tracker.iter_bookmarks(limit=limit, after_id=after_id)
+    
+    # Stream the JSON array so large lists are never held in memory twice
+    def generate():
+        yield b'['
+        for i, bookmark in enumerate(bookmarks):
+            if i:
+                yield b','
+            yield orjson.dumps(bookmark)
+        yield b']'
+    
+    return Response(generate(), mimetype='application/json')
 
 @api.route('/bookmarks', methods=['POST'])
-@login_required
 def add_bookmark():
     data = request.get_json()
     if not data or 'url' not in data:
-        return jsonify({'error': 'Missing URL'}), 400
+        return json_response({'error': 'Missing URL'}, 400)
     
-    bookmark_tracker.add_bookmark(data['url'], user_id=session.get('user_id'))
-    return jsonify({'message': 'Bookmark added successfully'})
+    get_tracker().add_bookmark(data['url'], user_id=g.user['id'])
+    return json_response({'message': 'Bookmark added successfully'})
 
 @api.route('/bookmarks/<int:bookmark_id>', methods=['DELETE'])
-@login_required
 def delete_bookmark(bookmark_id):
-    bookmark_tracker.delete_bookmark(bookmark_id)
-    return jsonify({'message': 'Bookmark deleted successfully'})
+    get_tracker().delete_bookmark(bookmark_id)
+    return json_response({'message': 'Bookmark deleted successfully'})
 
 @api.route('/browsers', methods=['GET'])
-@login_required
 def get_browsers():
-    browsers = bookmark_tracker.get_browsers()
-    return jsonify(browsers)
+    browsers = get_tracker().get_browsers()
+    return json_response(browsers)
 
 @api.route('/import', methods=['POST'])
-@login_required
 def import_bookmarks():
     data = request.get_json()
     if not data or 'browser' not in data:
-        return jsonify({'error': 'Missing browser name'}), 400
+        return json_response({'error': 'Missing browser name'}, 400)
     
-    bookmarks = bookmark_tracker.import_from_browser(data['browser'])
+    tracker = get_tracker()
+    bookmarks = tracker.import_from_browser(data['browser'])
     
     # Add imported bookmarks to the database
-    for bookmark in bookmarks:
-        bookmark_tracker.add_bookmark(
-            bookmark['url'],
-            title=bookmark['title'],
-            user_id=session.get('user_id')
-        )
+    tracker.add_bookmarks(bookmarks, user_id=g.user['id'])
     
-    return jsonify({'message': f'Successfully imported {len(bookmarks)} bookmarks'})
+    return json_response({'message': f'Successfully imported {len(bookmarks)} bookmarks'})
 
-@api.route('/docs', methods=['GET'])
-def get_documentation():
-    return jsonify({
-        'endpoints': {
-            '/api/login': {
-                'method': 'POST',
-                'description': 'Login to the system',
-                'required_fields': ['username', 'password'],
-                'response': {
-                    'success': {'message': 'Login successful'},
-                    'error': {'error': 'Invalid credentials'}
-                }
-            },
-            '/api/logout': {
-                'method': 'POST',
-                'description': 'Logout from the system',
-                'response': {'message': 'Logged out successfully'}
-            },
-            '/api/bookmarks': {
-                'GET': {
-                    'description': 'Get all bookmarks',
-                    'authentication': 'Required',
-                    'response': 'List of bookmarks'
-                },
-                'POST': {
-                    'description': 'Add a new bookmark',
-                    'authentication': 'Required',
-                    'required_fields': ['url'],
-                    'response': {'message': 'Bookmark added successfully'}
-                }
-            },
-            '/api/bookmarks/<id>': {
-                'DELETE': {
-                    'description': 'Delete a bookmark',
-                    'authentication': 'Required',
-                    'response': {'message': 'Bookmark deleted successfully'}
-                }
-            },
-            '/api/browsers': {
-                'GET': {
-                    'description': 'Get detected browsers',
-                    'authentication': 'Required',
-                    'response': 'List of browsers'
-                }
+# The documentation is constant, so serialize it once and serve the bytes
+API_DOCS = {
+    'endpoints': {
+        '/api/login': {
+            'method': 'POST',
+            'description': 'Login to the system',
+            'required_fields': ['username', 'password'],
+            'response': {
+                'success': {'message': 'Login successful'},
+                'error': {'error': 'Invalid credentials'}
+            }
+        },
+        '/api/logout': {
+            'method': 'POST',
+            'description': 'Logout from the system',
+            'response': {'message': 'Logged out successfully'}
+        },
+        '/api/bookmarks': {
+            'GET': {
+                'description': 'Get all bookmarks',
+                'authentication': 'Required',
+                'optional_fields': ['limit', 'after_id'],
+                'response': 'List of bookmarks',
+                'errors': [
+                    {'error': 'limit must not be negative'},
+                    {'error': 'Unknown after_id'}
+                ]
             },
-            '/api/import': {
-                'POST': {
-                    'description': 'Import bookmarks from a browser',
-                    'authentication': 'Required',
-                    'required_fields': ['browser'],
-                    'response': {'message': 'Import success message'}
-                }
+            'POST': {
+                'description': 'Add a new bookmark',
+                'authentication': 'Required',
+                'required_fields': ['url'],
+                'response': {'message': 'Bookmark added successfully'}
+            }
+        },
+        '/api/bookmarks/<id>': {
+            'DELETE': {
+                'description': 'Delete a bookmark',
+                'authentication': 'Required',
+                'response': {'message': 'Bookmark deleted successfully'}
+            }
+        },
+        '/api/browsers': {
+            'GET': {
+                'description': 'Get detected browsers',
+                'authentication': 'Required',
+                'response': 'List of browsers'
+            }
+        },
+        '/api/import': {
+            'POST': {
+                'description': 'Import bookmarks from a browser',
+                'authentication': 'Required',
+                'required_fields': ['browser'],
+                'response': {'message': 'Import success message'}
             }
         }
-    })
+    }
+}
+_DOCS_JSON = orjson.dumps(API_DOCS, option=orjson.OPT_SORT_KEYS)
+_DOCS_JSON_GZ = gzip.compress(_DOCS_JSON, 9)
+_DOCS_ETAG = hashlib.sha256(_DOCS_JSON).hexdigest()
+
+@api.route('/docs', methods=['GET'])
+def get_documentation():
+    if request.accept_encodings['gzip']:
+        response = Response(_DOCS_JSON_GZ, mimetype='application/json')
+        response.headers['Content-Encoding'] = 'gzip'
+        response.set_etag(_DOCS_ETAG + '-gzip')
+    else:
+        response = Response(_DOCS_JSON, mimetype='application/json')
+        response.set_etag(_DOCS_ETAG)
+    response.vary.add('Accept-Encoding')
+    return response.make_conditional(request)
 
 @api.route('/create-admin', methods=['POST'])
-@admin_required
 def create_admin():
     data = request.get_json()
-    if not data or 'username' not in data or 'password' not in data:
-        return jsonify({'error': 'Missing username or password'}), 400
-    
-    db = get_db()
-    cursor = db.cursor()
-    
-    # Check if username exists
-    cursor.execute('SELECT * FROM users WHERE username = ?', (data['username'],))
-    if cursor.fetchone():
-        db.close()
-        return jsonify({'error': 'Username already exists'}), 400
-    
-    # Create new admin user
-    salt = secrets.token_hex(16)
-    password_hash = hashlib.sha256((data['password'] + salt).encode()).hexdigest()
-    
-    cursor.execute('''
-        INSERT INTO users (username, password_hash, salt, is_admin)
-        VALUES (?, ?, ?, 1)
-    ''', (data['username'], password_hash, salt))
+    if not data or not CREDENTIAL_FIELDS.issubset(data):
+        return json_response({'error': 'Missing username or password'}, 400)
     
-    db.commit()
-    db.close()
-    return jsonify({'message': 'Admin user created successfully'}) 
\ No newline at end of file
+    success, message = create_admin_user(data['username'], data['password'])
+    if not success:
+        return json_response({'error': message}, 400)
+    return json_response({'message': message}) 
\ No newline at end of file
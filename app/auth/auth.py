@@ -1,9 +1,14 @@
 import sqlite3
+import base64
 import hashlib
+import hmac
 import secrets
 import os
-from functools import wraps
-from flask import session, jsonify, current_app
+import queue
+import threading
+from contextlib import closing, contextmanager
+from flask import g, request, session, current_app
+from app.responses import json_response
 
 def get_db_path():
     """Get the database path"""
@@ -11,93 +16,264 @@ def get_db_path():
         raise RuntimeError('Application not in context')
     return os.path.join(current_app.instance_path, 'bookmarks.db')
 
-def get_db():
-    """Get database connection"""
-    db_path = get_db_path()
-    db = sqlite3.connect(db_path)
+# WAL lets any number of readers run alongside the single writer
+READ_POOL_SIZE = 4
+
+SQL_GET_USER = '''
+    SELECT id, password_hash, is_admin
+    FROM users INDEXED BY idx_users_login
+    WHERE username = ?
+'''
+SQL_INSERT_USER = '''
+    INSERT INTO users (username, password_hash, is_admin)
+    VALUES (?, ?, ?)
+    ON CONFLICT(username) DO NOTHING
+'''
+
+SQL_CREATE_USERS = '''
+    CREATE TABLE IF NOT EXISTS {table} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        is_admin BOOLEAN DEFAULT 0,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+
+# (writer, readers) connection pools keyed by database path, opened by the first get_db()
+# in each process so forked workers never share connections
+_pools = {}
+_pools_lock = threading.Lock()
+
+def _connect(db_path, readonly=False):
+    """Open a connection configured for reuse across requests"""
+    db = sqlite3.connect(db_path, check_same_thread=False)
     db.row_factory = sqlite3.Row
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.execute('PRAGMA busy_timeout=5000')
+    db.execute('PRAGMA temp_store=MEMORY')
+    db.execute('PRAGMA cache_size=-20000')
+    db.execute('PRAGMA mmap_size=268435456')
+    if readonly:
+        db.execute('PRAGMA query_only=ON')
+    # Prime the connection's statement cache for the login lookup
+    db.execute(SQL_GET_USER, ('',)).fetchall()
     return db
 
+def init_pool(db_path, size=READ_POOL_SIZE):
+    """Create the writer and reader connection pools for a database"""
+    pools = _pools.get(db_path)
+    if pools is None:
+        with _pools_lock:
+            pools = _pools.get(db_path)
+            if pools is None:
+                writer = queue.Queue(maxsize=1)
+                writer.put(_connect(db_path))
+                readers = queue.Queue(maxsize=size)
+                for _ in range(size):
+                    readers.put(_connect(db_path, readonly=True))
+                pools = _pools[db_path] = (writer, readers)
+    return pools
+
+@contextmanager
+def get_db(readonly=False):
+    """Borrow a database connection from the pool"""
+    writer, readers = init_pool(get_db_path())
+    pool = readers if readonly else writer
+    db = pool.get()
+    try:
+        yield db
+    finally:
+        # Drop anything left uncommitted so the next borrower starts clean
+        db.rollback()
+        pool.put(db)
+
+# Bump whenever init_db() changes the schema so existing instances rerun it
+SCHEMA_VERSION = '1'
+
 def init_db(app):
     """Initialize database with users table"""
+    # Ensure instance folder exists
+    os.makedirs(app.instance_path, exist_ok=True)
+    
+    db_path = os.path.join(app.instance_path, 'bookmarks.db')
+    sentinel = os.path.join(app.instance_path, '.db_initialized')
+    if not _is_initialized(db_path, sentinel):
+        _create_schema(app, db_path)
+        with open(sentinel, 'w') as f:
+            f.write(SCHEMA_VERSION)
+
+def _is_initialized(db_path, sentinel):
+    """Check whether this schema version was already set up for db_path"""
+    if not os.path.exists(db_path):
+        return False
     try:
-        # Ensure instance folder exists
-        os.makedirs(app.instance_path, exist_ok=True)
-        
-        db_path = os.path.join(app.instance_path, 'bookmarks.db')
-        db = sqlite3.connect(db_path)
-        cursor = db.cursor()
-        
-        # Create users table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                salt TEXT NOT NULL,
-                is_admin BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Check if admin user exists
-        cursor.execute('SELECT * FROM users WHERE username = ?', ('admin',))
-        if not cursor.fetchone():
-            # Create default admin user
-            salt = secrets.token_hex(16)
-            password_hash = hashlib.sha256(('password123' + salt).encode()).hexdigest()
-            cursor.execute('''
-                INSERT INTO users (username, password_hash, salt, is_admin)
-                VALUES (?, ?, ?, 1)
-            ''', ('admin', password_hash, salt))
-        
-        db.commit()
+        with open(sentinel) as f:
+            if f.read() != SCHEMA_VERSION:
+                return False
+    except FileNotFoundError:
+        return False
+    
+    # A restored or copied database may lack the index SQL_GET_USER names, and
+    # every pooled connection would then fail to open; a read is enough to tell
+    with closing(sqlite3.connect(db_path)) as db:
+        cursor = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_users_login'")
+        return cursor.fetchone() is not None
+
+def _create_schema(app, db_path):
+    """Create or migrate the users table and seed the default admin"""
+    try:
+        with closing(sqlite3.connect(db_path)) as db:
+            # Commits when the block succeeds, rolls back if it raises
+            with db:
+                cursor = db.cursor()
+                
+                # Take the write lock up front so workers starting together run this one at a time
+                cursor.execute('BEGIN IMMEDIATE')
+                
+                # Create users table if it doesn't exist
+                cursor.execute(SQL_CREATE_USERS.format(table='users'))
+                
+                # Databases created before hashes embedded their salt still have the column
+                cursor.execute('PRAGMA table_info(users)')
+                if any(column[1] == 'salt' for column in cursor.fetchall()):
+                    _migrate_salt_column(cursor)
+                
+                # Covering index so the login lookup never touches the table itself;
+                # SQL_GET_USER names it because the planner prefers the UNIQUE index
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_users_login
+                    ON users (username, password_hash, is_admin)
+                ''')
+                
+                # Only hash the default password when the admin is actually missing:
+                # scrypt is deliberately slow, so an unconditional INSERT OR IGNORE
+                # would pay for it on every start
+                cursor.execute('SELECT 1 FROM users WHERE username = ? LIMIT 1', ('admin',))
+                if not cursor.fetchone():
+                    password_hash = hash_password('password123')
+                    cursor.execute(SQL_INSERT_USER, ('admin', password_hash, 1))
+            
+            db.execute('PRAGMA optimize')
     except sqlite3.Error as e:
         app.logger.error(f"Database error: {e}")
         raise
-    finally:
-        db.close()
 
-def verify_password(password, stored_hash, salt):
+def _migrate_salt_column(cursor):
+    """Fold the separate salt column into password_hash and drop it"""
+    cursor.execute('SELECT id, password_hash, salt FROM users')
+    for user_id, password_hash, salt in cursor.fetchall():
+        password_hash = f'{SHA256_PREFIX}{salt}${password_hash}'
+        cursor.execute('UPDATE users SET password_hash = ? WHERE id = ?', (password_hash, user_id))
+    if sqlite3.sqlite_version_info >= (3, 35, 0):
+        cursor.execute('ALTER TABLE users DROP COLUMN salt')
+    else:
+        # DROP COLUMN needs SQLite 3.35; older builds copy into a table without it
+        cursor.execute(SQL_CREATE_USERS.format(table='users_new'))
+        cursor.execute('''
+            INSERT INTO users_new (id, username, password_hash, is_admin, created_at)
+            SELECT id, username, password_hash, is_admin, created_at FROM users
+        ''')
+        cursor.execute('DROP TABLE users')
+        cursor.execute('ALTER TABLE users_new RENAME TO users')
+
+# scrypt cost parameters, recorded in every hash so they can change later
+SCRYPT_LN = 14
+SCRYPT_R = 8
+SCRYPT_P = 1
+SCRYPT_PARAMS = f'ln={SCRYPT_LN},r={SCRYPT_R},p={SCRYPT_P}'
+SCRYPT_PREFIX = '$scrypt$'
+# Legacy salted SHA-256 hashes: $sha256$<salt>$<hex digest>
+SHA256_PREFIX = '$sha256$'
+
+def _b64encode(data):
+    return base64.b64encode(data).decode('ascii').rstrip('=')
+
+def _b64decode(data):
+    return base64.b64decode(data + '=' * (-len(data) % 4))
+
+def _format_scrypt_hash(salt, digest):
+    return f'{SCRYPT_PREFIX}{SCRYPT_PARAMS}${_b64encode(salt)}${_b64encode(digest)}'
+
+def hash_password(password):
+    """Hash a password with scrypt into a PHC-format string"""
+    salt = secrets.token_bytes(16)
+    digest = hashlib.scrypt(password.encode(), salt=salt,
+                            n=2**SCRYPT_LN, r=SCRYPT_R, p=SCRYPT_P, dklen=32)
+    return _format_scrypt_hash(salt, digest)
+
+# Checked against when the username is unknown, so that login takes as long as a wrong password
+DUMMY_PASSWORD_HASH = hash_password(secrets.token_urlsafe())
+
+def verify_password(password, stored_hash):
     """Verify password against stored hash"""
-    return hashlib.sha256((password + salt).encode()).hexdigest() == stored_hash
-
-def login_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'logged_in' not in session:
-            return jsonify({'error': 'Authentication required'}), 401
-        return f(*args, **kwargs)
-    return decorated_function
-
-def admin_required(f):
-    @wraps(f)
-    def decorated_function(*args, **kwargs):
-        if 'logged_in' not in session or not session.get('is_admin'):
-            return jsonify({'error': 'Admin privileges required'}), 403
-        return f(*args, **kwargs)
-    return decorated_function
+    if stored_hash.startswith(SCRYPT_PREFIX):
+        params, salt, digest = stored_hash[len(SCRYPT_PREFIX):].split('$')
+        params = dict(param.split('=') for param in params.split(','))
+        expected = _b64decode(digest)
+        computed = hashlib.scrypt(password.encode(), salt=_b64decode(salt),
+                                  n=2**int(params['ln']), r=int(params['r']),
+                                  p=int(params['p']), dklen=len(expected))
+        return hmac.compare_digest(computed, expected)
+    
+    # Legacy salted SHA-256 hash from before the switch to scrypt
+    salt, digest = stored_hash[len(SHA256_PREFIX):].split('$')
+    computed = hashlib.sha256(password.encode())
+    computed.update(salt.encode())
+    return hmac.compare_digest(computed.digest(), bytes.fromhex(digest))
+
+def needs_rehash(stored_hash):
+    """Check whether a stored hash predates the current scrypt parameters"""
+    return not stored_hash.startswith(f'{SCRYPT_PREFIX}{SCRYPT_PARAMS}$')
+
+def rehash_password(user_id, password):
+    """Replace a user's stored hash with one using the current parameters"""
+    with get_db() as db:
+        db.execute('UPDATE users SET password_hash = ? WHERE id = ?',
+                   (hash_password(password), user_id))
+        db.commit()
+
+# Endpoints reachable without a session; every other endpoint requires login
+PUBLIC_ENDPOINTS = frozenset({
+    'static',
+    'main.index',
+    'main.login_page',
+    'api.login',
+    'api.logout',
+    'api.get_documentation',
+})
+ADMIN_ENDPOINTS = frozenset({'api.create_admin'})
+
+def check_access():
+    """Load the session's user into g and enforce login/admin access"""
+    if 'user_id' in session:
+        g.user = {'id': session['user_id'], 'is_admin': session.get('is_admin', False)}
+    else:
+        g.user = None
+    
+    endpoint = request.endpoint
+    if endpoint is None or endpoint in PUBLIC_ENDPOINTS:
+        return None
+    if endpoint in ADMIN_ENDPOINTS:
+        if g.user is None or not g.user['is_admin']:
+            return json_response({'error': 'Admin privileges required'}, 403)
+    elif g.user is None:
+        return json_response({'error': 'Authentication required'}, 401)
+    return None
 
 def create_admin_user(username, password):
     """Create a new admin user"""
-    db = get_db()
-    cursor = db.cursor()
-    
-    # Check if username already exists
-    cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
-    if cursor.fetchone():
-        db.close()
-        return False, "Username already exists"
-    
-    # Create new admin user
-    salt = secrets.token_hex(16)
-    password_hash = hashlib.sha256((password + salt).encode()).hexdigest()
+    password_hash = hash_password(password)
     
-    cursor.execute('''
-        INSERT INTO users (username, password_hash, salt, is_admin)
-        VALUES (?, ?, ?, 1)
-    ''', (username, password_hash, salt))
-    
-    db.commit()
-    db.close()
-    return True, "Admin user created successfully" 
\ No newline at end of file
+    with get_db() as db:
+        cursor = db.cursor()
+        
+        # The UNIQUE constraint on username rejects duplicates in one statement
+        cursor.execute(SQL_INSERT_USER, (username, password_hash, 1))
+        if cursor.rowcount != 1:
+            return False, "Username already exists"
+        
+        db.commit()
+    return True, "Admin user created successfully"
\ No newline at end of file
@@ -0,0 +1,6 @@
+from flask import Response
+import orjson
+
+def json_response(payload, status=200):
+    """Serialize a payload with orjson into a JSON response"""
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
